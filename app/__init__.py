@@ -6,8 +6,10 @@ Factory de la aplicación Flask (Web_v2).
 - Registra blueprints.
 - Inicializa extensiones (mail, db).
 - Carga configuración desde entorno (.env soportado vía wsgi.py).
-- Crea esquema de BD y carpetas de runtime.
+- Crea carpetas de runtime; el esquema/migraciones de BD van por CLI:
+    flask --app wsgi bootstrap   (una vez por deploy, o RUN_BOOTSTRAP=1)
 - Define filtros Jinja útiles y comandos CLI:
+    * bootstrap
     * send-test-email
     * purge-comprobantes
     * purge-seat-holds
@@ -20,21 +22,22 @@ Notas:
 from __future__ import annotations
 
 import os
-from datetime import timedelta
-from flask import Flask
+import re
+from flask import Flask, request
+
+# JSON: orjson si está instalado (decode 2-3× más rápido); fallback a stdlib.
+try:
+    import orjson as _json
+except ImportError:  # pragma: no cover - depende del entorno
+    import json as _json
 
 # Extensiones
 from .extensions import mail
 from app import db as db_mod  # usamos db_mod.init_app y db_mod.create_schema
 
-# Blueprints
-from .blueprints.main import bp as main_bp
-from .blueprints.venta import bp as venta_bp
-from .blueprints.pago import bp as pago_bp
-from .blueprints.archivos import bp as archivos_bp
-from .blueprints.auth import bp as auth_bp
-from .blueprints.mercadopago import bp as mercadopago_bp
-from .blueprints.pago_mp import bp as pago_mp_bp
+# Nota: los blueprints se importan DENTRO de create_app() (no acá) para que
+# `import app` sea barato: los blueprints arrastran SDK de pagos, PDF/QR y
+# mail, y eso penaliza cada cold start de worker y cada comando `flask ...`.
 
 
 def _bool_env(name: str, default: bool = False) -> bool:
@@ -44,6 +47,46 @@ def _bool_env(name: str, default: bool = False) -> bool:
     return str(v).strip().lower() in {"1", "true", "yes", "y", "on"}
 
 
+# Tabla para pasar de formato en-US (1,234.56) a ARS (1.234,56) en un solo
+# recorrido C de str.translate, en vez de tres .replace() encadenados.
+_PESO_TRANS = str.maketrans(",.", ".,")
+
+# Activos estáticos con hash en el nombre (ej. app.3f2d8a1c.css): su
+# contenido no cambia nunca, el browser puede cachearlos como immutable.
+_HASHED_ASSET_RE = re.compile(r"\.[0-9a-f]{8,}\.")
+
+# Las carpetas de runtime se aseguran una sola vez por proceso (create_app
+# puede llamarse más de una vez, p.ej. en tests).
+_RUNTIME_DIRS_READY = False
+
+
+def _bootstrap_db(app: Flask) -> None:
+    """
+    Inicialización one-shot de la BD (requiere app context activo):
+    migraciones de MercadoPago, esquema base y purga de holds vencidos.
+    """
+    # Verificar y ejecutar migraciones de MercadoPago si es necesario
+    from app.db_migrations import check_migration_needed, migrate_add_mercadopago_support
+
+    if check_migration_needed():
+        app.logger.info("Ejecutando migración de MercadoPago...")
+        if migrate_add_mercadopago_support():
+            app.logger.info("✅ Migración de MercadoPago completada")
+        else:
+            app.logger.error("❌ Error en migración de MercadoPago")
+
+    # asegura tablas (usuarios, transacciones, seats, etc.)
+    db_mod.create_schema()
+
+    # Limpieza de holds vencidos (opcional; deja todo más prolijo en dev)
+    try:
+        removed = db_mod.purge_expired_holds()
+        if removed:
+            app.logger.info("Limpieza inicial: eliminados %s seat_holds vencidos.", removed)
+    except Exception as e:
+        app.logger.warning("No se pudo purgar holds al inicio: %s", e)
+
+
 def create_app() -> Flask:
     """
     Crea y configura la instancia de Flask.
@@ -57,7 +100,7 @@ def create_app() -> Flask:
     # ----------------- Configuración ----------------- #
     # Seguridad / sesión
     app.config["SECRET_KEY"] = os.getenv("FLASK_SECRET", "change-me-in-dev-only")
-    app.config["PERMANENT_SESSION_LIFETIME"] = timedelta(hours=6)
+    app.config["PERMANENT_SESSION_LIFETIME"] = 6 * 3600  # Flask acepta segundos
     app.config["SESSION_COOKIE_HTTPONLY"] = True
     app.config["SESSION_COOKIE_SAMESITE"] = "Lax"
     app.config["SESSION_COOKIE_SECURE"] = _bool_env("SESSION_COOKIE_SECURE", False)  # activar en prod HTTPS
@@ -65,6 +108,11 @@ def create_app() -> Flask:
     # Cache estáticos
     app.config["SEND_FILE_MAX_AGE_DEFAULT"] = 60 * 60 * 24 * 7  # 7 días
 
+    # Templates: fuera de debug no re-stat()eamos los archivos en cada render;
+    # el template compilado queda cacheado por Jinja.
+    app.config["TEMPLATES_AUTO_RELOAD"] = app.debug
+    app.jinja_env.auto_reload = app.debug
+
     # Mail / SMTP (usado por Flask-Mail y nuestro emailer)
     app.config["MAIL_SERVER"] = os.getenv("MAIL_SERVER", "localhost")
     app.config["MAIL_PORT"] = int(os.getenv("MAIL_PORT", "25"))
@@ -107,6 +155,14 @@ def create_app() -> Flask:
     db_mod.init_app(app)   # registra teardown y comando `flask init-db`
 
     # ----------------- Blueprints ----------------- #
+    # Imports diferidos: recién acá se paga el costo de cargar cada módulo.
+    from .blueprints.main import bp as main_bp
+    from .blueprints.venta import bp as venta_bp
+    from .blueprints.pago import bp as pago_bp
+    from .blueprints.pago_mp import bp as pago_mp_bp
+    from .blueprints.archivos import bp as archivos_bp
+    from .blueprints.auth import bp as auth_bp
+
     app.register_blueprint(main_bp)      # "/", "/bienvenida", set/clear branch
     app.register_blueprint(venta_bp)     # "/cartelera", "/reserva-asientos", etc.
     app.register_blueprint(pago_bp)      # "/pago" (sistema con opciones MercadoPago y Tarjeta)
@@ -123,57 +179,95 @@ def create_app() -> Flask:
     def _peso(value):
         """Formatea números como moneda ARS: $ 1.234,56"""
         try:
-            return f"$ {float(value):,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+            return "$ " + format(float(value), ",.2f").translate(_PESO_TRANS)
         except Exception:
             return value
 
     @app.template_filter("from_json")
     def _from_json(value):
         """Convierte string JSON a objeto Python"""
-        try:
-            import json
-            if isinstance(value, str):
-                return json.loads(value)
+        if not isinstance(value, (str, bytes)):
             return value
+        try:
+            return _json.loads(value)
         except Exception:
             return []
 
-    # Funciones disponibles en todos los templates
+    # Funciones disponibles en todos los templates.
+    # El blueprint auth ya está importado (se registró arriba): resolvemos los
+    # callables UNA vez acá y el processor devuelve el dict ya armado, en vez
+    # de re-importar y hacer tres getattr por render.
+    from app.blueprints.auth import current_user, is_logged_in, is_admin
+    _auth_ctx = {
+        'current_user': current_user,
+        'is_logged_in': is_logged_in,
+        'is_admin': is_admin,
+    }
+
     @app.context_processor
     def inject_auth_functions():
-        from app.blueprints.auth import current_user, is_logged_in, is_admin
-        return {
-            'current_user': current_user,
-            'is_logged_in': is_logged_in,
-            'is_admin': is_admin
-        }
-
-    # ----------------- DB & runtime bootstrap ----------------- #
-    with app.app_context():
-        # Verificar y ejecutar migraciones de MercadoPago si es necesario
-        from app.db_migrations import check_migration_needed, migrate_add_mercadopago_support
-        
-        if check_migration_needed():
-            app.logger.info("Ejecutando migración de MercadoPago...")
-            if migrate_add_mercadopago_support():
-                app.logger.info("✅ Migración de MercadoPago completada")
-            else:
-                app.logger.error("❌ Error en migración de MercadoPago")
-        
-        # asegura tablas (usuarios, transacciones, seats, etc.)
-        db_mod.create_schema()
+        return _auth_ctx
+
+    # Cache-Control explícito para /static/: 'public' siempre, y para
+    # archivos versionados por hash, un año + immutable (el browser ni
+    # siquiera revalida).
+    @app.after_request
+    def _static_cache_headers(resp):
+        if request.path.startswith("/static/"):
+            cc = resp.cache_control
+            cc.public = True
+            if cc.max_age is None:
+                cc.max_age = app.config["SEND_FILE_MAX_AGE_DEFAULT"]
+            if _HASHED_ASSET_RE.search(request.path):
+                cc.max_age = 31536000  # 1 año
+                cc.immutable = True
+        return resp
+
+    # ----------------- Runtime bootstrap ----------------- #
+    # Solo lo barato e idempotente en cada fork de worker: las carpetas,
+    # y una única vez por proceso (flag de módulo; exist_ok ya costaba
+    # stat+mkdir por llamada). El esquema/migraciones van por
+    # `flask bootstrap` (o RUN_BOOTSTRAP=1), así los workers de gunicorn
+    # no pagan DDL + transacción de escritura en cada cold start.
+    global _RUNTIME_DIRS_READY
+    if not _RUNTIME_DIRS_READY:
         os.makedirs(app.config["COMPROBANTES_DIR"], exist_ok=True)
         os.makedirs(app.config["QR_DIR"], exist_ok=True)
+        _RUNTIME_DIRS_READY = True
 
-        # Limpieza de holds vencidos al iniciar (opcional; deja todo más prolijo en dev)
-        try:
-            removed = db_mod.purge_expired_holds()
-            if removed:
-                app.logger.info("Limpieza inicial: eliminados %s seat_holds vencidos.", removed)
-        except Exception as e:
-            app.logger.warning("No se pudo purgar holds al inicio: %s", e)
+    if _bool_env("RUN_BOOTSTRAP", False):
+        with app.app_context():
+            _bootstrap_db(app)
+
+    # Pre-compilar los templates del flujo de compra para que el primer
+    # request no pague el parse de Jinja (solo fuera de debug/testing).
+    if not app.debug and not app.testing:
+        with app.app_context():
+            for _tpl in (
+                "bienvenida.html",
+                "cartelera.html",
+                "combos.html",
+                "confirmacion.html",
+                "pago.html",
+                "pago_ok.html",
+            ):
+                try:
+                    app.jinja_env.get_template(_tpl)
+                except Exception as e:
+                    app.logger.debug("No se pudo precompilar %s: %s", _tpl, e)
 
     # ----------------- Comandos CLI útiles ----------------- #
+    # 0) Bootstrap de BD (esquema + migraciones + limpieza de holds)
+    @app.cli.command("bootstrap")
+    def bootstrap_command():
+        """
+        Crea/migra el esquema de BD y purga holds vencidos.
+        Correr una vez por deploy (antes de levantar los workers):
+            flask --app wsgi bootstrap
+        """
+        _bootstrap_db(app)
+        print("✔ Bootstrap de BD completado.")
+
     # 1) Enviar email de prueba (útil para validar SMTP sin mostrar AUTH en consola)
     @app.cli.command("send-test-email")
     def send_test_email():
@@ -254,20 +348,31 @@ def create_app() -> Flask:
 
     # ----------------- Logging básico ----------------- #
     if not app.debug and not app.testing:
+        import atexit
         import logging
-        from logging.handlers import RotatingFileHandler
+        import queue
+        from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
         log_dir = os.path.join(app.root_path, "..", "logs")
         os.makedirs(log_dir, exist_ok=True)
-        handler = RotatingFileHandler(
+        file_handler = RotatingFileHandler(
             os.path.join(log_dir, "app.log"),
             maxBytes=1_000_000,
             backupCount=3,
             encoding="utf-8",
         )
-        handler.setLevel(logging.INFO)
+        file_handler.setLevel(logging.INFO)
         fmt = logging.Formatter("[%(asctime)s] %(levelname)s in %(module)s: %(message)s")
-        handler.setFormatter(fmt)
-        app.logger.addHandler(handler)
+        file_handler.setFormatter(fmt)
+
+        # El write()/rotación del archivo corre en un hilo consumidor propio:
+        # el request solo encola el registro y no bloquea en IO de disco.
+        log_queue: queue.SimpleQueue = queue.SimpleQueue()
+        listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+        listener.start()
+        atexit.register(listener.stop)
+
+        app.logger.addHandler(QueueHandler(log_queue))
         app.logger.setLevel(logging.INFO)
 
     return app
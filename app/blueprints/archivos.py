@@ -5,6 +5,8 @@ from __future__ import annotations
 import os
 from flask import Blueprint, current_app, send_from_directory, abort
 
+from app import db as db_mod
+
 bp = Blueprint("archivos", __name__)
 
 def _abs_storage_dir(rel_or_abs: str) -> str:
@@ -18,6 +20,9 @@ def descargar_comprobante(trx_id: int):
     """
     Devuelve el PDF generado por services/pdfs.py
     Nombre por defecto: 'comprobante_trx_{trx_id}.pdf'
+
+    El PDF se genera en segundo plano después del pago: si la transacción
+    existe pero el archivo todavía no está, respondemos 202 (reintentar).
     """
     filename = f"comprobante_trx_{trx_id}.pdf"
     rel_dir = current_app.config.get("COMPROBANTES_DIR", "static/comprobantes")
@@ -25,6 +30,14 @@ def descargar_comprobante(trx_id: int):
     file_path = os.path.join(directory, filename)
 
     if not os.path.exists(file_path):
+        trx = db_mod.get_transaccion(trx_id)
+        if trx and trx.get("estado") == "APROBADO":
+            # Generación en curso: avisamos que se reintente en unos segundos
+            return (
+                "Comprobante en preparación. Reintentá en unos segundos.",
+                202,
+                {"Retry-After": "3", "Content-Type": "text/plain; charset=utf-8"},
+            )
         abort(404, description="Comprobante no encontrado")
 
     # Forzar descarga
@@ -4,9 +4,11 @@
 Blueprint 'pago': formulario de pago (GET) y procesamiento (POST).
 - Valida tarjeta (Luhn/brand/CVV/vencimiento).
 - Calcula el total del lado del servidor (entradas + combos).
-- Inserta transacción (estado PENDIENTE -> APROBADO/RECHAZADA).
 - Confirma asientos (consume holds -> reservas definitivas).
-- Genera QR + PDF del comprobante.
+- Inserta transacción ya con su estado final (APROBADO/RECHAZADA)
+  en una sola transacción de escritura.
+- Genera QR + PDF del comprobante en un pool de hilos en segundo plano
+  (el usuario no espera a ReportLab/PIL/SMTP para ver la confirmación).
 - (Opcional) Envía email con adjunto, si EMAIL_DEBUG=0.
 
 Requisitos en el proyecto:
@@ -23,9 +25,10 @@ Requisitos en el proyecto:
 
 from __future__ import annotations
 
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from decimal import Decimal, ROUND_HALF_UP
-from typing import List
+from functools import lru_cache
+from typing import List, Optional
 
 from flask import (
     Blueprint,
@@ -38,68 +41,163 @@ from flask import (
 )
 
 # ====== IMPORTS ABSOLUTOS (evita E0402) ======
+# qrs/pdfs/emailer se importan recién al generar el comprobante: arrastran
+# qrcode+PIL, fpdf2 y Flask-Mail, que no hacen falta para cargar el módulo
+# ni para el GET del formulario.
 from app.service.payments import validar_tarjeta, detectar_brand
-from app.service.qrs import generar_qr
-from app.service.pdfs import generar_comprobante_pdf
-from app.service.emailer import enviar_ticket
 from app.db import get_conn
 from app import db as db_mod
-from app.data.seed import COMBOS_CATALOG
+from app.data.seed import COMBOS_CATALOG, COMBOS_BY_ID
 
 bp = Blueprint("pago", __name__)
 
+# Precios resueltos una sola vez, en CENTAVOS enteros: los precios siempre
+# son montos exactos en centavos, así que todo el camino caliente trabaja
+# con int (sumas nativas) y recién al renderizar se formatea a pesos.
+_COMBO_PRICE_CENTS: dict[int, int] = {
+    c["id"]: int(round(float(c.get("precio", 0)) * 100)) for c in COMBOS_CATALOG
+}
 
-# ===================== Helpers internos ===================== #
+# Limpieza del PAN en un solo pase C: saca espacios/tabs/guiones que meten
+# los navegadores al autocompletar, sin una alloc por .replace().
+_PAN_STRIP = str.maketrans("", "", " \t-")
 
-def _combos_from_session() -> List[dict]:
-    """Obtiene los combos seleccionados (lista de dicts) desde sesión."""
-    ids = [int(x) for x in session.get("combos", [])]
-    idset = set(ids)
-    return [c for c in COMBOS_CATALOG if c["id"] in idset]
 
+def _cents_str(cents: int) -> str:
+    """Formatea centavos como '1234.56' (para validación y display)."""
+    return f"{cents // 100}.{cents % 100:02d}"
 
-def _seleccion_from_session() -> dict:
-    """Obtiene la selección de película/función desde sesión."""
-    return session.get("movie_selection", {}) or {}
 
+# Pool para generar comprobantes (QR + PDF) y mandar el email fuera del
+# request. Se crea recién en el primer pago aprobado.
+_comprobante_pool: Optional[ThreadPoolExecutor] = None
 
-def _seats_from_session() -> List[str]:
-    """Obtiene los asientos seleccionados desde sesión."""
-    return session.get("seats", []) or []
 
+def _get_comprobante_pool() -> ThreadPoolExecutor:
+    global _comprobante_pool  # noqa: PLW0603
+    if _comprobante_pool is None:
+        _comprobante_pool = ThreadPoolExecutor(
+            max_workers=2, thread_name_prefix="comprobante"
+        )
+    return _comprobante_pool
+
+
+def _build_comprobante_and_email(
+    app,
+    *,
+    trx_id: int,
+    cliente: str,
+    email: str,
+    seleccion: dict,
+    confirmados: List[str],
+    combos_sel: List[dict],
+    total_cents: int,
+    sucursal: str,
+    auth_code: str,
+) -> None:
+    """
+    Worker de fondo: genera QR + PDF y (opcional) envía el email.
+    Corre en el pool, con su propio app context (y su propia conexión
+    sqlite si algún servicio la necesita).
+    """
+    # Import diferido: recién acá se pagan qrcode/PIL, fpdf2 y Flask-Mail
+    from app.service.qrs import generar_qr
+    from app.service.pdfs import generar_comprobante_pdf
+    from app.service.emailer import enviar_ticket
+
+    with app.app_context():
+        try:
+            qr_path = generar_qr(
+                trx_id=trx_id,
+                verify_url=None,  # Si luego tenés endpoint de verificación, colocalo aquí
+                extra={"email": email, "auth": auth_code},
+            )
+            pdf_path = generar_comprobante_pdf(
+                trx_id=trx_id,
+                cliente=cliente,
+                email=email,
+                pelicula=seleccion.get("titulo", "-"),
+                fecha_funcion=seleccion.get("fecha", "-"),
+                hora_funcion=seleccion.get("hora", "-"),
+                sala=seleccion.get("sala", "-"),
+                asientos=confirmados,
+                combos=[{"nombre": c["nombre"], "cantidad": 1, "precio": c["precio"]} for c in combos_sel],
+                total=total_cents / 100,  # para la plantilla de PDF
+                sucursal=sucursal,
+                qr_path=qr_path,
+            )
+        except Exception as e:
+            app.logger.exception("Error generando comprobante TRX #%s: %s", trx_id, e)
+            return
+
+        try:
+            enviar_ticket(
+                destino=email,
+                asunto=f"Comprobante TRX #{trx_id}",
+                cuerpo=(
+                    f"Gracias por su compra.\n\n"
+                    f"Sucursal: {sucursal}\n"
+                    f"Película: {seleccion.get('titulo','-')}\n"
+                    f"Fecha/Hora: {seleccion.get('fecha','-')} {seleccion.get('hora','-')}\n"
+                    f"Asientos: {', '.join(confirmados) if confirmados else '-'}\n"
+                    f"Monto: ${_cents_str(total_cents)}\n"
+                    f"Código de autorización: {auth_code}\n"
+                ),
+                adjunto_path=pdf_path,
+            )
+        except (OSError, ValueError, RuntimeError) as e:
+            # En modo debug o si falla SMTP, registramos y seguimos
+            app.logger.warning("Email no enviado (debug/SMTP): %s", e)
+
+
+# ===================== Helpers internos ===================== #
 
-def _precio_entrada() -> Decimal:
+def _ctx_from_session() -> tuple[List[str], List[dict], dict]:
     """
-    Precio unitario de la entrada desde config (TICKET_PRICE).
-    Por defecto, 5000.00
+    Lee de una sola pasada todo lo que el checkout necesita de la sesión:
+    (seats, combos_sel, seleccion). Un solo acceso a `session` evita repetir
+    el decode/verificación HMAC de la cookie y las búsquedas de dict.
     """
-    raw = str(current_app.config.get("TICKET_PRICE", "5000"))
+    s = session
+    combos_sel = [
+        COMBOS_BY_ID[i]
+        for i in {int(x) for x in s.get("combos", [])}
+        if i in COMBOS_BY_ID
+    ]
+    return (s.get("seats") or [], combos_sel, s.get("movie_selection") or {})
+
+
+@lru_cache(maxsize=1)
+def _precio_entrada_cached(raw: str) -> int:
     try:
-        return Decimal(raw)
+        return int(round(float(raw) * 100))
     except Exception:
-        return Decimal("5000")
+        return 500000  # 5000.00 por defecto
+
+
+def _precio_entrada_cents() -> int:
+    """
+    Precio unitario de la entrada en centavos, desde config (TICKET_PRICE).
+    Por defecto, 5000.00. Cacheado: TICKET_PRICE no cambia en runtime.
+    """
+    return _precio_entrada_cached(str(current_app.config.get("TICKET_PRICE", "5000")))
 
 
-def _calcular_totales_server_side() -> tuple[Decimal, Decimal, Decimal, list[dict], list[str], dict]:
+def _calcular_totales_server_side() -> tuple[int, int, int, list[dict], list[str], dict]:
     """
-    Calcula en el servidor:
-    - total_entradas = precio_entrada * cantidad_asientos
-    - total_combos = sum(precio combos elegidos)
-    - total = total_entradas + total_combos (redondeado a 2 decimales)
-    Devuelve (total_entradas, total_combos, total, combos_sel, seats, seleccion)
+    Calcula en el servidor, todo en centavos enteros:
+    - entradas_cents = precio_entrada * cantidad_asientos
+    - combos_cents = sum(precio combos elegidos)
+    - total_cents = entradas_cents + combos_cents
+    Devuelve (entradas_cents, combos_cents, total_cents, combos_sel, seats, seleccion)
     """
-    TWO = Decimal("0.01")
-    precio_ent = _precio_entrada()
-    seats = _seats_from_session()
-    combos_sel = _combos_from_session()
-    seleccion = _seleccion_from_session()
+    seats, combos_sel, seleccion = _ctx_from_session()
 
-    total_entradas = (precio_ent * Decimal(len(seats))).quantize(TWO, rounding=ROUND_HALF_UP)
-    total_combos = sum(Decimal(str(c.get("precio", 0))) for c in combos_sel)
-    total_combos = Decimal(total_combos).quantize(TWO, rounding=ROUND_HALF_UP)
-    total = (total_entradas + total_combos).quantize(TWO, rounding=ROUND_HALF_UP)
+    entradas_cents = _precio_entrada_cents() * len(seats)
+    combos_cents = sum(_COMBO_PRICE_CENTS[c["id"]] for c in combos_sel)
+    total_cents = entradas_cents + combos_cents
 
-    return total_entradas, total_combos, total, combos_sel, seats, seleccion
+    return entradas_cents, combos_cents, total_cents, combos_sel, seats, seleccion
 
 
 # ===================== Rutas público ===================== #
@@ -115,7 +213,8 @@ def pago():
         email = user.get("email", "")
         nombre_tarjeta = f"{user.get('nombre','')} {user.get('apellido','')}".strip().upper()
 
-        total_entradas, total_combos, total, combos, seats, seleccion = _calcular_totales_server_side()
+        entradas_cents, combos_cents, total_cents, combos, seats, seleccion = _calcular_totales_server_side()
+        monto_str = _cents_str(total_cents)  # un solo formateo para todo el render
 
         return render_template(
             "pago.html",
@@ -126,16 +225,17 @@ def pago():
             seleccion=seleccion,
             seats=seats,
             combos=combos,
-            monto_sugerido=f"{total:.2f}",          # Solo visual. En POST no se usa.
-            total_entradas=total_entradas,
-            total_combos=total_combos,
-            total=total,
-            precio_entrada=_precio_entrada(),
+            monto_sugerido=monto_str,  # Solo visual. En POST no se usa.
+            total_entradas=entradas_cents / 100,
+            total_combos=combos_cents / 100,
+            total=total_cents / 100,
+            precio_entrada=_precio_entrada_cents() / 100,
         )
 
     # ---------- POST: procesar pago ----------
     # SIEMPRE recalculamos del lado del servidor (NO usamos monto del form)
-    total_entradas, total_combos, total, combos_sel, seats, seleccion = _calcular_totales_server_side()
+    entradas_cents, combos_cents, total_cents, combos_sel, seats, seleccion = _calcular_totales_server_side()
+    monto_str = _cents_str(total_cents)
 
     if not seats or not seleccion:
         flash("Primero elegí función y asientos.", "warning")
@@ -148,23 +248,23 @@ def pago():
             seleccion=seleccion,
             seats=seats,
             combos=combos_sel,
-            monto_sugerido=f"{total:.2f}",
-            total_entradas=total_entradas,
-            total_combos=total_combos,
-            total=total,
-            precio_entrada=_precio_entrada(),
+            monto_sugerido=monto_str,
+            total_entradas=entradas_cents / 100,
+            total_combos=combos_cents / 100,
+            total=total_cents / 100,
+            precio_entrada=_precio_entrada_cents() / 100,
         )
 
     # Datos del form (pero el monto viene del server)
     email = (request.form.get("email") or "").strip()
-    pan = (request.form.get("pan") or "").replace(" ", "")
+    pan = (request.form.get("pan") or "").translate(_PAN_STRIP)
     nombre_tarjeta = (request.form.get("nombre_tarjeta") or "").strip()
     exp_mes = (request.form.get("exp_mes") or "").strip()
     exp_anio = (request.form.get("exp_anio") or "").strip()
     cvv = (request.form.get("cvv") or "").strip()
 
     # Validación tarjeta (le pasamos el total calculado)
-    errores = validar_tarjeta(email, pan, nombre_tarjeta, exp_mes, exp_anio, cvv, f"{total:.2f}")
+    errores = validar_tarjeta(email, pan, nombre_tarjeta, exp_mes, exp_anio, cvv, monto_str)
     if errores:
         return render_template(
             "pago.html",
@@ -175,11 +275,11 @@ def pago():
             seleccion=seleccion,
             seats=seats,
             combos=combos_sel,
-            monto_sugerido=f"{total:.2f}",
-            total_entradas=total_entradas,
-            total_combos=total_combos,
-            total=total,
-            precio_entrada=_precio_entrada(),
+            monto_sugerido=monto_str,
+            total_entradas=entradas_cents / 100,
+            total_combos=combos_cents / 100,
+            total=total_cents / 100,
+            precio_entrada=_precio_entrada_cents() / 100,
         )
 
     # Datos derivados transacción
@@ -188,12 +288,47 @@ def pago():
     now_iso = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     auth_code = f"APP-{last4}-{datetime.now().strftime('%H%M%S')}"
 
-    # Monto en centavos (Decimal seguro)
-    monto_cents = int((total * 100).to_integral_value(rounding=ROUND_HALF_UP))
+    # Monto ya viene en centavos enteros: pasamanos directo
+    monto_cents = total_cents
+
+    # ---------- Persistencia: una sola transacción de escritura ----------
+    # confirm_seats participa de la transacción del INSERT (conn=conn): las
+    # reservas, la fila de la transacción (ya con su estado final APROBADO/
+    # RECHAZADA) y el vínculo trx_id se commitean juntos, así no existe
+    # ventana con reservas confirmadas sin transacción asociada.
+    hold_token = session.get("hold_token")
+    confirmados: List[str] = []
+    error_asientos = None
 
-    # ---------- Persistencia: crear transacción en estado PENDIENTE ----------
     conn = get_conn()
+    conn.execute("BEGIN IMMEDIATE")
     try:
+        try:
+            confirmados = db_mod.confirm_seats(
+                token=hold_token,
+                movie_id=seleccion.get("id"),
+                fecha=seleccion.get("fecha"),
+                hora=seleccion.get("hora"),
+                sala=seleccion.get("sala"),
+                usuario_email=email or None,
+                trx_id=None,  # se vincula abajo vía link_reservas_to_trx
+                conn=conn,
+            )
+            if not confirmados:
+                # No había holds vigentes
+                error_asientos = "Los asientos se liberaron por tiempo. Volvé a seleccionarlos."
+                flash("Tus asientos ya no estaban retenidos. Por favor, volvé a elegirlos.", "warning")
+        except ValueError as e:
+            # Colisión de último momento con otro usuario: descartar las
+            # reservas parciales y registrar la RECHAZADA en limpio.
+            conn.rollback()
+            error_asientos = str(e)
+            flash(str(e), "danger")
+            conn.execute("BEGIN IMMEDIATE")
+            confirmados = []
+
+        estado = "RECHAZADA" if error_asientos else "APROBADO"
+
         cur = conn.cursor()
         cur.execute(
             """
@@ -201,6 +336,7 @@ def pago():
                 usuario_email, monto_cents, brand, last4, exp_mes, exp_anio,
                 estado, auth_code, created_at
             ) VALUES (?,?,?,?,?,?,?,?,?)
+            RETURNING id
             """,
             (
                 email or None,
@@ -209,125 +345,66 @@ def pago():
                 last4 or None,
                 int(exp_mes) if exp_mes else None,
                 int(exp_anio) if exp_anio else None,
-                "PENDIENTE",
+                estado,
                 auth_code,
                 now_iso,
             ),
         )
-        trx_id = int(cur.lastrowid or 0)
-        conn.commit()
-    finally:
-        # No cierres la conexión aquí; usamos get_conn() por request y teardown la cierra
-        pass
-
-    # ---------- Confirmar asientos (consume holds del token) ----------
-    hold_token = session.get("hold_token")
-    try:
-        confirmados = db_mod.confirm_seats(
-            token=hold_token,
-            movie_id=seleccion.get("id"),
-            fecha=seleccion.get("fecha"),
-            hora=seleccion.get("hora"),
-            sala=seleccion.get("sala"),
-            usuario_email=email or None,
-            trx_id=trx_id,
-        )
-        if not confirmados:
-            # No había holds vigentes => marcamos transacción como RECHAZADA
-            conn.execute("UPDATE transacciones SET estado=? WHERE id=?", ("RECHAZADA", trx_id))
-            conn.commit()
-            flash("Tus asientos ya no estaban retenidos. Por favor, volvé a elegirlos.", "warning")
-            return_url = url_for("venta.reserva_asientos")
-            return render_template(
-                "pago.html",
-                errores=["Los asientos se liberaron por tiempo. Volvé a seleccionarlos."],
-                exito=None,
-                email=email,
-                nombre_tarjeta=nombre_tarjeta,
-                seleccion=seleccion,
-                seats=seats,
-                combos=combos_sel,
-                monto_sugerido=f"{total:.2f}",
-                total_entradas=total_entradas,
-                total_combos=total_combos,
-                total=total,
-                precio_entrada=_precio_entrada(),
-                volver_url=return_url,
+        trx_id = int(cur.fetchone()[0])
+        if confirmados:
+            db_mod.link_reservas_to_trx(
+                conn,
+                movie_id=seleccion.get("id"),
+                fecha=seleccion.get("fecha"),
+                hora=seleccion.get("hora"),
+                sala=seleccion.get("sala"),
+                seats=confirmados,
+                trx_id=trx_id,
             )
-
-    except ValueError as e:
-        # Colisión de último momento con otro usuario
-        conn.execute("UPDATE transacciones SET estado=? WHERE id=?", ("RECHAZADA", trx_id))
         conn.commit()
-        flash(str(e), "danger")
+    except Exception:
+        conn.rollback()
+        raise
+    # No cierres la conexión aquí; usamos get_conn() por request y teardown la cierra
+
+    if error_asientos:
         return_url = url_for("venta.reserva_asientos")
         return render_template(
             "pago.html",
-            errores=[str(e)],
+            errores=[error_asientos],
             exito=None,
             email=email,
             nombre_tarjeta=nombre_tarjeta,
             seleccion=seleccion,
             seats=seats,
             combos=combos_sel,
-            monto_sugerido=f"{total:.2f}",
-            total_entradas=total_entradas,
-            total_combos=total_combos,
-            total=total,
-            precio_entrada=_precio_entrada(),
+            monto_sugerido=monto_str,
+            total_entradas=entradas_cents / 100,
+            total_combos=combos_cents / 100,
+            total=total_cents / 100,
+            precio_entrada=_precio_entrada_cents() / 100,
             volver_url=return_url,
         )
 
-    # Si llegamos aquí, los asientos quedaron confirmados.
-    conn.execute("UPDATE transacciones SET estado=? WHERE id=?", ("APROBADO", trx_id))
-    conn.commit()
-
-    # ---------- Datos para comprobante ----------
+    # ---------- Comprobante + email en segundo plano ----------
+    # QR/PDF (ReportLab, PIL) y SMTP tardan cientos de ms; el usuario ve la
+    # confirmación ya mismo y /comprobante/<id>/descargar responde 202 hasta
+    # que el PDF esté listo.
     sucursal = session.get("branch") or current_app.config.get("DEFAULT_BRANCH", "-")
-
-    # QR (payload firmado si config['QR_SIGN_SECRET'] está presente)
-    qr_path = generar_qr(
-        trx_id=trx_id,
-        verify_url=None,  # Si luego tenés endpoint de verificación, colocalo aquí
-        extra={"email": email, "auth": auth_code},
-    )
-
-    # PDF
-    pdf_path = generar_comprobante_pdf(
+    _get_comprobante_pool().submit(
+        _build_comprobante_and_email,
+        current_app._get_current_object(),
         trx_id=trx_id,
         cliente=(nombre_tarjeta or "-"),
         email=email,
-        pelicula=seleccion.get("titulo", "-"),
-        fecha_funcion=seleccion.get("fecha", "-"),
-        hora_funcion=seleccion.get("hora", "-"),
-        sala=seleccion.get("sala", "-"),
-        asientos=confirmados,  # usar los confirmados
-        combos=[{"nombre": c["nombre"], "cantidad": 1, "precio": c["precio"]} for c in combos_sel],
-        total=float(total),  # para la plantilla de PDF
+        seleccion=seleccion,
+        confirmados=confirmados,
+        combos_sel=combos_sel,
+        total_cents=total_cents,
         sucursal=sucursal,
-        qr_path=qr_path,
+        auth_code=auth_code,
     )
 
-    # ---------- Email opcional ----------
-    try:
-        enviar_ticket(
-            destino=email,
-            asunto=f"Comprobante TRX #{trx_id}",
-            cuerpo=(
-                f"Gracias por su compra.\n\n"
-                f"Sucursal: {sucursal}\n"
-                f"Película: {seleccion.get('titulo','-')}\n"
-                f"Fecha/Hora: {seleccion.get('fecha','-')} {seleccion.get('hora','-')}\n"
-                f"Asientos: {', '.join(confirmados) if confirmados else '-'}\n"
-                f"Monto: ${total:.2f}\n"
-                f"Código de autorización: {auth_code}\n"
-            ),
-            adjunto_path=pdf_path,
-        )
-    except (OSError, ValueError, RuntimeError) as e:
-        # En modo debug o si falla SMTP, registramos y seguimos
-        current_app.logger.warning("Email no enviado (debug/SMTP): %s", e)
-
     # URL de descarga (ideal: servir fuera de /static en prod, con autorización)
     comprobante_url = url_for("archivos.descargar_comprobante", trx_id=trx_id)
 
@@ -342,10 +419,11 @@ def pago():
         exito="¡Pago aprobado!",
         trx_id=trx_id,
         comprobante_url=comprobante_url,
+        pendiente_pdf=True,  # el PDF puede tardar unos segundos en estar listo
         seleccion=seleccion,
         seats=confirmados,
         combos=combos_sel,
-        total=float(total),
+        total=total_cents / 100,
         brand=brand,
         last4=last4,
         auth_code=auth_code,
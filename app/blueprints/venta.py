@@ -41,7 +41,7 @@ from flask import (
     url_for,
 )
 
-from app.data.seed import MOVIES, COMBOS_CATALOG
+from app.data.seed import MOVIES, COMBOS_CATALOG, COMBOS_BY_ID
 import app.db as db_mod
 
 bp = Blueprint("venta", __name__)
@@ -383,10 +383,9 @@ def confirmacion():
         flash("Falta elegir función y asientos.", "warning")
         return redirect(url_for("venta.cartelera"))
 
-    # Combos elegidos a partir de los IDs en sesión
-    ids = [int(x) for x in session.get("combos", [])]
-    idset = set(ids)
-    combos_elegidos = [c for c in COMBOS_CATALOG if c["id"] in idset]
+    # Combos elegidos a partir de los IDs en sesión (lookup O(1) por id)
+    ids = {int(x) for x in session.get("combos", [])}
+    combos_elegidos = [COMBOS_BY_ID[i] for i in ids if i in COMBOS_BY_ID]
 
     # Totales
     # Si no definiste un precio por entrada, queda en 0.
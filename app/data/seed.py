@@ -51,3 +51,6 @@ COMBOS_CATALOG = [
     {"id": 2, "nombre": "Combo 2", "descripcion": "2× Popcorn + 2× Bebida", "precio": 2500},
     {"id": 3, "nombre": "Combo 3", "descripcion": "Popcorn + Nachos + Bebida", "precio": 2000},
 ]
+
+# Índice por id para lookup O(1) (evita recorrer el catálogo por request).
+COMBOS_BY_ID = {c["id"]: c for c in COMBOS_CATALOG}
@@ -59,8 +59,13 @@ def get_conn() -> sqlite3.Connection:
 
     conn = sqlite3.connect(
         _db_path(),
-        detect_types=sqlite3.PARSE_DECLTYPES,
-        isolation_level=None,  # transacciona con "with conn:"
+        # Sin PARSE_DECLTYPES: las fechas son TEXT ISO y la plata INTEGER
+        # cents, así que no hay nada que convertir; con detect_types cada
+        # columna TIMESTAMP pagaba un callback Python por fila leída.
+        detect_types=0,
+        # autocommit por statement; las operaciones multi-statement abren su
+        # transacción explícita con BEGIN IMMEDIATE (ver hold/confirm_seats).
+        isolation_level=None,
     )
     conn.row_factory = sqlite3.Row
     try:
@@ -69,6 +74,10 @@ def get_conn() -> sqlite3.Connection:
             conn.execute("PRAGMA journal_mode = WAL;")
             conn.execute("PRAGMA synchronous = NORMAL;")
             conn.execute("PRAGMA temp_store = MEMORY;")
+            # Checkouts concurrentes: esperar al writer en vez de fallar
+            # con "database is locked", y mapear el archivo en memoria.
+            conn.execute("PRAGMA busy_timeout = 5000;")
+            conn.execute("PRAGMA mmap_size = 268435456;")  # 256 MiB
     except Exception:
         pass
     g.db = conn
@@ -194,7 +203,11 @@ CREATE TABLE IF NOT EXISTS transacciones (
     auth_code     TEXT,
     created_at    TEXT
 );
-CREATE INDEX IF NOT EXISTS idx_trx_email ON transacciones(usuario_email);
+-- Compuesto (email, estado): sirve el filtro combinado y, por prefijo,
+-- las búsquedas por email solo; un árbol menos que mantener por INSERT.
+-- El drop hace converger a las BD que ya tenían el índice simple.
+DROP INDEX IF EXISTS idx_trx_email;
+CREATE INDEX IF NOT EXISTS idx_trans_email_estado ON transacciones(usuario_email, estado);
 CREATE INDEX IF NOT EXISTS idx_trx_fecha ON transacciones(created_at);
 
 -- =========================
@@ -253,8 +266,12 @@ def _try_create_index(conn: sqlite3.Connection, create_sql: str, warn: str) -> N
     try:
         conn.execute(create_sql)
     except sqlite3.OperationalError as e:
-        # sucede si columnas no existen en BD legacy o hay duplicados
-        current_app.logger.warning("%s: %s", warn, e)
+        # sucede si columnas no existen en BD legacy o hay duplicados.
+        # sqlite_errorname (Python 3.11+) da el código estable del error
+        # sin inspeccionar el texto del mensaje.
+        current_app.logger.warning(
+            "%s [%s]: %s", warn, getattr(e, "sqlite_errorname", "SQLITE_ERROR"), e
+        )
 
 
 def _migrate_legacy_show_tables(conn: sqlite3.Connection) -> None:
@@ -548,7 +565,10 @@ def hold_seats(
     exp = now + int(ttl_sec)
     conn = get_conn()
 
-    with conn:  # transacción
+    with conn:  # commit/rollback al salir
+        # Con isolation_level=None cada statement autocommitea: abrimos la
+        # transacción explícita para que DELETE + N INSERT sean un solo fsync.
+        conn.execute("BEGIN IMMEDIATE")
         # 1) limpiar holds previos de este token para esta función
         if _has_column(conn, "seat_holds", "token"):
             conn.execute(
@@ -646,71 +666,134 @@ def confirm_seats(
     sala: str,
     usuario_email: Optional[str],
     trx_id: Optional[int],
+    conn: Optional[sqlite3.Connection] = None,
 ) -> List[str]:
     """
     Convierte los holds del token en reservas definitivas.
     Devuelve la lista de asientos confirmados.
+
+    Si recibe `conn`, participa en la transacción ya abierta por el
+    llamador (no emite BEGIN/COMMIT propios); útil para confirmar e
+    insertar la transacción de pago con un único commit. Sin `conn`,
+    maneja su propia transacción como siempre.
     """
     now = int(time.time())
-    conn = get_conn()
+    if conn is not None:
+        return _confirm_seats_in_txn(
+            conn, now, token=token, movie_id=movie_id, fecha=fecha,
+            hora=hora, sala=sala, usuario_email=usuario_email, trx_id=trx_id,
+        )
 
+    conn = get_conn()
     with conn:
-        seat_col_h = _seat_column_name(conn, "seat_holds")
-        # 1) seats retenidos vigentes por este token
-        if _has_column(conn, "seat_holds", "token"):
-            cur = conn.execute(
-                f"""
-                SELECT {seat_col_h} AS s FROM seat_holds
-                 WHERE token=? AND movie_id=? AND fecha=? AND hora=? AND sala=?
-                   AND expires_at >= ?
-                """,
-                [token, movie_id, fecha, hora, sala, now],
-            )
-        else:
-            cur = conn.execute(
-                f"""
-                SELECT {seat_col_h} AS s FROM seat_holds
-                 WHERE movie_id=? AND fecha=? AND hora=? AND sala=?
-                   AND expires_at >= ?
-                """,
-                [movie_id, fecha, hora, sala, now],
-            )
-        seats = [r["s"] for r in cur.fetchall()]
-        cur.close()
-        if not seats:
-            return []
+        # Un solo fsync para el SELECT + N INSERT + DELETE del consumo de holds
+        conn.execute("BEGIN IMMEDIATE")
+        return _confirm_seats_in_txn(
+            conn, now, token=token, movie_id=movie_id, fecha=fecha,
+            hora=hora, sala=sala, usuario_email=usuario_email, trx_id=trx_id,
+        )
 
-        # 2) insertar reservas
-        seat_col_r = _seat_column_name(conn, "seat_reservas")
-        for s in seats:
-            try:
-                conn.execute(
-                    f"""
-                    INSERT INTO seat_reservas
-                        (usuario_email, trx_id, movie_id, fecha, hora, sala, {seat_col_r}, reserved_at)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                    """,
-                    [usuario_email, trx_id, movie_id, fecha, hora, sala, s, now],
-                )
-            except sqlite3.IntegrityError as ie:
-                raise ValueError(f"Asiento ya reservado: {s}") from ie
 
-        # 3) borrar holds consumidos
-        if _has_column(conn, "seat_holds", "token"):
-            conn.execute(
-                """
-                DELETE FROM seat_holds
-                 WHERE token=? AND movie_id=? AND fecha=? AND hora=? AND sala=?
-                """,
-                [token, movie_id, fecha, hora, sala],
-            )
-        else:
+def _confirm_seats_in_txn(
+    conn: sqlite3.Connection,
+    now: int,
+    *,
+    token: str,
+    movie_id: str,
+    fecha: str,
+    hora: str,
+    sala: str,
+    usuario_email: Optional[str],
+    trx_id: Optional[int],
+) -> List[str]:
+    """Cuerpo de confirm_seats; asume transacción abierta sobre `conn`."""
+    seat_col_h = _seat_column_name(conn, "seat_holds")
+    # 1) seats retenidos vigentes por este token
+    if _has_column(conn, "seat_holds", "token"):
+        cur = conn.execute(
+            f"""
+            SELECT {seat_col_h} AS s FROM seat_holds
+             WHERE token=? AND movie_id=? AND fecha=? AND hora=? AND sala=?
+               AND expires_at >= ?
+            """,
+            [token, movie_id, fecha, hora, sala, now],
+        )
+    else:
+        cur = conn.execute(
+            f"""
+            SELECT {seat_col_h} AS s FROM seat_holds
+             WHERE movie_id=? AND fecha=? AND hora=? AND sala=?
+               AND expires_at >= ?
+            """,
+            [movie_id, fecha, hora, sala, now],
+        )
+    seats = [r["s"] for r in cur.fetchall()]
+    cur.close()
+    if not seats:
+        return []
+
+    # 2) insertar reservas
+    seat_col_r = _seat_column_name(conn, "seat_reservas")
+    for s in seats:
+        try:
             conn.execute(
-                """
-                DELETE FROM seat_holds
-                 WHERE movie_id=? AND fecha=? AND hora=? AND sala=?
+                f"""
+                INSERT INTO seat_reservas
+                    (usuario_email, trx_id, movie_id, fecha, hora, sala, {seat_col_r}, reserved_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
                 """,
-                [movie_id, fecha, hora, sala],
+                [usuario_email, trx_id, movie_id, fecha, hora, sala, s, now],
             )
+        except sqlite3.IntegrityError as ie:
+            raise ValueError(f"Asiento ya reservado: {s}") from ie
+
+    # 3) borrar holds consumidos
+    if _has_column(conn, "seat_holds", "token"):
+        conn.execute(
+            """
+            DELETE FROM seat_holds
+             WHERE token=? AND movie_id=? AND fecha=? AND hora=? AND sala=?
+            """,
+            [token, movie_id, fecha, hora, sala],
+        )
+    else:
+        conn.execute(
+            """
+            DELETE FROM seat_holds
+             WHERE movie_id=? AND fecha=? AND hora=? AND sala=?
+            """,
+            [movie_id, fecha, hora, sala],
+        )
 
     return seats
+
+
+def link_reservas_to_trx(
+    conn: sqlite3.Connection,
+    *,
+    movie_id: str,
+    fecha: str,
+    hora: str,
+    sala: str,
+    seats: List[str],
+    trx_id: int,
+) -> int:
+    """
+    Vincula reservas recién confirmadas (trx_id NULL) de una función con
+    su transacción de pago. Pensada para correr dentro de la misma
+    transacción que confirmó los asientos e insertó la fila de pago.
+    Devuelve cuántas reservas vinculó.
+    """
+    if not seats:
+        return 0
+    seat_col = _seat_column_name(conn, "seat_reservas")
+    ph = ",".join("?" for _ in seats)
+    cur = conn.execute(
+        f"""
+        UPDATE seat_reservas SET trx_id=?
+         WHERE trx_id IS NULL AND movie_id=? AND fecha=? AND hora=? AND sala=?
+           AND {seat_col} IN ({ph})
+        """,
+        [trx_id, movie_id, fecha, hora, sala, *seats],
+    )
+    return int(cur.rowcount or 0)
@@ -1,254 +1,374 @@
-# app/db_migrations.py
-# -*- coding: utf-8 -*-
-"""
-Migraciones de base de datos para soporte de MercadoPago
-"""
-
-import sqlite3
-from flask import current_app
-from app.db import get_conn, execute, executescript
-
-def migrate_add_mercadopago_support():
-    """
-    Migración para agregar soporte completo de MercadoPago
-    Agrega tabla de transacciones y funciones mejoradas
-    """
-    
-    try:
-        conn = get_conn()
-        
-        # Verificar si la tabla transacciones ya existe
-        cur = conn.execute("""
-            SELECT name FROM sqlite_master 
-            WHERE type='table' AND name='transacciones'
-        """)
-        table_exists = cur.fetchone() is not None
-        
-        if table_exists:
-            # La tabla existe, agregar columnas de MercadoPago una por una
-            current_app.logger.info("📊 Tabla transacciones existe, agregando columnas MP...")
-            
-            # Lista de columnas que necesitamos agregar
-            new_columns = [
-                ("monto_cents", "INTEGER NOT NULL DEFAULT 0"),
-                ("mp_preference_id", "TEXT"),
-                ("mp_payment_id", "TEXT"), 
-                ("mp_status", "TEXT"),
-                ("mp_status_detail", "TEXT"),
-                ("monto_mp", "DECIMAL(10,2)"),
-                ("monto_neto_mp", "DECIMAL(10,2)"),
-                ("external_reference", "TEXT"),
-                ("funcion_id", "INTEGER"),
-                ("pelicula", "TEXT"),
-                ("fecha_funcion", "TEXT"),
-                ("hora_funcion", "TEXT"),
-                ("sala", "TEXT"),
-                ("asientos_json", "TEXT"),
-                ("combos_json", "TEXT"),
-                ("notas", "TEXT"),
-                ("ip_cliente", "TEXT"),
-                ("user_agent", "TEXT"),
-                ("fecha_actualizacion", "TIMESTAMP")
-            ]
-            
-            for column_name, column_def in new_columns:
-                try:
-                    conn.execute(f"ALTER TABLE transacciones ADD COLUMN {column_name} {column_def}")
-                    current_app.logger.info(f"✅ Columna {column_name} agregada")
-                except sqlite3.OperationalError as e:
-                    if "duplicate column name" in str(e).lower():
-                        current_app.logger.info(f"⚡ Columna {column_name} ya existe")
-                    else:
-                        current_app.logger.warning(f"⚠️ Error agregando {column_name}: {str(e)}")
-            
-            # Migrar email_cliente -> usuario_email si es necesario
-            try:
-                cur = conn.execute("SELECT email_cliente FROM transacciones LIMIT 1")
-                current_app.logger.info("🔄 Migrando email_cliente -> usuario_email")
-                
-                try:
-                    conn.execute("ALTER TABLE transacciones ADD COLUMN usuario_email TEXT")
-                except sqlite3.OperationalError:
-                    pass
-                
-                conn.execute("UPDATE transacciones SET usuario_email = email_cliente WHERE usuario_email IS NULL")
-                current_app.logger.info("✅ Migración email_cliente completada")
-                
-            except sqlite3.OperationalError:
-                current_app.logger.info("⚡ Tabla ya usa usuario_email")
-        
-        else:
-            # Crear tabla desde cero
-            current_app.logger.info("🏗️ Creando tabla transacciones completa...")
-            executescript("""
-                CREATE TABLE IF NOT EXISTS transacciones (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    usuario_email TEXT NOT NULL,
-                    monto_cents INTEGER NOT NULL DEFAULT 0,
-                    total_pesos DECIMAL(10,2) NOT NULL,
-                    estado TEXT NOT NULL DEFAULT 'PENDIENTE',
-                    funcion_id INTEGER,
-                    pelicula TEXT,
-                    fecha_funcion TEXT,
-                    hora_funcion TEXT,
-                    sala TEXT,
-                    asientos_json TEXT,
-                    combos_json TEXT,
-                    mp_preference_id TEXT,
-                    mp_payment_id TEXT,
-                    mp_status TEXT,
-                    mp_status_detail TEXT,
-                    monto_mp DECIMAL(10,2),
-                    monto_neto_mp DECIMAL(10,2),
-                    external_reference TEXT,
-                    brand TEXT,
-                    last4 TEXT,
-                    exp_mes INTEGER,
-                    exp_anio INTEGER,
-                    auth_code TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    fecha_actualizacion TIMESTAMP,
-                    notas TEXT,
-                    ip_cliente TEXT,
-                    user_agent TEXT
-                );
-                
-                CREATE INDEX IF NOT EXISTS idx_transacciones_email ON transacciones(usuario_email);
-                CREATE INDEX IF NOT EXISTS idx_transacciones_estado ON transacciones(estado);
-                CREATE INDEX IF NOT EXISTS idx_transacciones_mp_payment ON transacciones(mp_payment_id);
-                CREATE INDEX IF NOT EXISTS idx_transacciones_external_ref ON transacciones(external_reference);
-            """)
-        
-        # Crear otras tablas necesarias
-        try:
-            executescript("""
-                CREATE TABLE IF NOT EXISTS funciones (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    pelicula TEXT NOT NULL,
-                    fecha TEXT NOT NULL,
-                    hora TEXT NOT NULL,
-                    sala TEXT NOT NULL,
-                    precio_entrada DECIMAL(10,2) NOT NULL DEFAULT 0,
-                    asientos_totales INTEGER DEFAULT 50,
-                    asientos_disponibles INTEGER DEFAULT 50,
-                    activo BOOLEAN DEFAULT 1,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                );
-                
-                CREATE INDEX IF NOT EXISTS idx_funciones_fecha_hora ON funciones(fecha, hora);
-                CREATE INDEX IF NOT EXISTS idx_funciones_pelicula ON funciones(pelicula);
-                
-                CREATE TABLE IF NOT EXISTS combos (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    nombre TEXT NOT NULL,
-                    descripcion TEXT,
-                    precio DECIMAL(10,2) NOT NULL,
-                    activo BOOLEAN DEFAULT 1,
-                    imagen_url TEXT,
-                    categoria TEXT DEFAULT 'combo',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                );
-                
-                CREATE INDEX IF NOT EXISTS idx_combos_activo ON combos(activo);
-            """)
-            current_app.logger.info("✅ Tablas auxiliares creadas")
-        except Exception as e:
-            current_app.logger.warning(f"⚠️ Error creando tablas auxiliares: {str(e)}")
-        
-        # Insertar datos de ejemplo
-        try:
-            insert_sample_data()
-        except Exception as e:
-            current_app.logger.warning(f"⚠️ Error insertando datos de ejemplo: {str(e)}")
-        
-        current_app.logger.info("✅ Migración MercadoPago completada exitosamente")
-        
-    except Exception as e:
-        current_app.logger.error(f"❌ Error en migración MercadoPago: {str(e)}")
-        raise
-
-def insert_sample_data():
-    """Inserta datos de ejemplo si las tablas están vacías"""
-    
-    try:
-        conn = get_conn()
-        
-        # Funciones de ejemplo
-        try:
-            cur = conn.execute("SELECT COUNT(*) as count FROM funciones")
-            if cur.fetchone()["count"] == 0:
-                current_app.logger.info("📝 Insertando funciones de ejemplo...")
-                
-                sample_funciones = [
-                    ("Avengers: Endgame", "2025-10-15", "20:00", "Sala 1", 2500.00),
-                    ("Avengers: Endgame", "2025-10-16", "18:00", "Sala 1", 2500.00),
-                    ("Spider-Man: No Way Home", "2025-10-15", "22:00", "Sala 2", 2800.00),
-                    ("Avatar: The Way of Water", "2025-10-16", "19:30", "Sala 3", 3000.00),
-                ]
-                
-                for pelicula, fecha, hora, sala, precio in sample_funciones:
-                    execute(
-                        "INSERT INTO funciones (pelicula, fecha, hora, sala, precio_entrada) VALUES (?, ?, ?, ?, ?)",
-                        [pelicula, fecha, hora, sala, precio],
-                        commit=False
-                    )
-        except Exception as e:
-            current_app.logger.warning(f"⚠️ Error insertando funciones: {str(e)}")
-        
-        # Combos de ejemplo  
-        try:
-            cur = conn.execute("SELECT COUNT(*) as count FROM combos")
-            if cur.fetchone()["count"] == 0:
-                current_app.logger.info("🍿 Insertando combos de ejemplo...")
-                
-                sample_combos = [
-                    ("Combo Clásico", "Pochoclos medianos + Gaseosa 500ml", 1500.00),
-                    ("Combo Familiar", "Pochoclos grandes + 2 Gaseosas 500ml", 2200.00),
-                    ("Combo Dulce", "Nachos + Gaseosa 500ml + Dulces", 1800.00),
-                    ("Solo Pochoclos", "Pochoclos grandes", 800.00),
-                    ("Solo Gaseosa", "Gaseosa 500ml", 600.00),
-                ]
-                
-                for nombre, descripcion, precio in sample_combos:
-                    execute(
-                        "INSERT INTO combos (nombre, descripcion, precio) VALUES (?, ?, ?)",
-                        [nombre, descripcion, precio],
-                        commit=False
-                    )
-        except Exception as e:
-            current_app.logger.warning(f"⚠️ Error insertando combos: {str(e)}")
-        
-        conn.commit()
-        current_app.logger.info("✅ Datos de ejemplo insertados")
-        
-    except Exception as e:
-        current_app.logger.error(f"❌ Error en insert_sample_data: {str(e)}")
-
-def check_migration_needed():
-    """Verifica si se necesita ejecutar la migración"""
-    try:
-        conn = get_conn()
-        
-        # Verificar si existe la tabla transacciones
-        cur = conn.execute("""
-            SELECT sql FROM sqlite_master 
-            WHERE type='table' AND name='transacciones'
-        """)
-        
-        result = cur.fetchone()
-        if not result:
-            return True  # Tabla no existe
-        
-        # Verificar si tiene las columnas de MercadoPago
-        table_sql = result["sql"]
-        mp_columns = ["mp_preference_id", "mp_payment_id", "external_reference"]
-        
-        for col in mp_columns:
-            if col not in table_sql:
-                return True  # Falta alguna columna de MP
-        
-        return False  # No necesita migración
-        
-    except Exception as e:
-        current_app.logger.error(f"Error verificando migración: {str(e)}")
+# app/db_migrations.py
+# -*- coding: utf-8 -*-
+"""
+Migraciones de base de datos para soporte de MercadoPago
+"""
+
+from flask import current_app
+from app.db import get_conn, executescript
+
+# Versión de esquema que deja esta migración, guardada en PRAGMA
+# user_version (un entero en el header de la BD): leerla es un acceso a
+# una página ya cacheada, sin inspeccionar table_info.
+# v4: bases selladas en 3 podían carecer de las columnas *_cents; el bump
+# las hace pasar de nuevo por la migración (hoy idempotente y barata).
+_SCHEMA_VERSION = 4
+
+# Datos de ejemplo como constantes de módulo (tuplas inmutables): se
+# construyen una sola vez al importar, no en cada llamada al seed.
+_SAMPLE_FUNCIONES = (
+    ("Avengers: Endgame", "2025-10-15", "20:00", "Sala 1", 250000),
+    ("Avengers: Endgame", "2025-10-16", "18:00", "Sala 1", 250000),
+    ("Spider-Man: No Way Home", "2025-10-15", "22:00", "Sala 2", 280000),
+    ("Avatar: The Way of Water", "2025-10-16", "19:30", "Sala 3", 300000),
+)
+
+_SAMPLE_COMBOS = (
+    ("Combo Clásico", "Pochoclos medianos + Gaseosa 500ml", 150000),
+    ("Combo Familiar", "Pochoclos grandes + 2 Gaseosas 500ml", 220000),
+    ("Combo Dulce", "Nachos + Gaseosa 500ml + Dulces", 180000),
+    ("Solo Pochoclos", "Pochoclos grandes", 80000),
+    ("Solo Gaseosa", "Gaseosa 500ml", 60000),
+)
+
+# DDL completo de la migración en una sola constante: todo es IF NOT
+# EXISTS, así que el mismo script sirve para crear desde cero y para
+# completar tablas auxiliares en una BD existente con un solo parse.
+_SCHEMA_SQL = """
+    CREATE TABLE IF NOT EXISTS transacciones (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        usuario_email TEXT NOT NULL,
+        monto_cents INTEGER NOT NULL DEFAULT 0,
+        total_pesos_cents INTEGER NOT NULL DEFAULT 0,
+        estado TEXT NOT NULL DEFAULT 'PENDIENTE',
+        funcion_id INTEGER,
+        pelicula TEXT,
+        fecha_funcion TEXT,
+        hora_funcion TEXT,
+        sala TEXT,
+        asientos_json TEXT,
+        combos_json TEXT,
+        mp_preference_id TEXT,
+        mp_payment_id TEXT,
+        mp_status TEXT,
+        mp_status_detail TEXT,
+        monto_mp_cents INTEGER,
+        monto_neto_mp_cents INTEGER,
+        external_reference TEXT,
+        brand TEXT,
+        last4 TEXT,
+        exp_mes INTEGER,
+        exp_anio INTEGER,
+        auth_code TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        fecha_actualizacion TIMESTAMP,
+        notas TEXT,
+        ip_cliente TEXT,
+        user_agent TEXT
+    );
+
+    DROP INDEX IF EXISTS idx_transacciones_email;
+    DROP INDEX IF EXISTS idx_transacciones_estado;
+    DROP INDEX IF EXISTS idx_transacciones_mp_payment;
+
+    -- Índice compuesto: cubre el filtro típico (email, estado) y también
+    -- las búsquedas por email solo, sin mantener dos árboles separados.
+    CREATE INDEX IF NOT EXISTS idx_trans_email_estado ON transacciones(usuario_email, estado);
+
+    -- Índice parcial: la mayoría de las filas no pasa por MercadoPago y
+    -- tiene mp_payment_id NULL; excluirlas achica el índice y su costo
+    -- de mantenimiento en cada INSERT.
+    CREATE INDEX IF NOT EXISTS idx_trans_mp_payment ON transacciones(mp_payment_id)
+        WHERE mp_payment_id IS NOT NULL;
+
+    CREATE INDEX IF NOT EXISTS idx_transacciones_external_ref ON transacciones(external_reference);
+
+    CREATE TABLE IF NOT EXISTS funciones (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        pelicula TEXT NOT NULL,
+        fecha TEXT NOT NULL,
+        hora TEXT NOT NULL,
+        sala TEXT NOT NULL,
+        precio_entrada_cents INTEGER NOT NULL DEFAULT 0,
+        asientos_totales INTEGER DEFAULT 50,
+        asientos_disponibles INTEGER DEFAULT 50,
+        activo BOOLEAN DEFAULT 1,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+
+    CREATE INDEX IF NOT EXISTS idx_funciones_fecha_hora ON funciones(fecha, hora);
+    CREATE INDEX IF NOT EXISTS idx_funciones_pelicula ON funciones(pelicula);
+
+    CREATE TABLE IF NOT EXISTS combos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nombre TEXT NOT NULL,
+        descripcion TEXT,
+        precio_cents INTEGER NOT NULL,
+        activo BOOLEAN DEFAULT 1,
+        imagen_url TEXT,
+        categoria TEXT DEFAULT 'combo',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+
+    CREATE INDEX IF NOT EXISTS idx_combos_activo ON combos(activo);
+"""
+
+# Columnas MP a agregar sobre una tabla transacciones preexistente, con
+# el ALTER ya armado: el SQL se construye una vez al importar, no en
+# cada corrida de la migración.
+_ALTERS = tuple(
+    (name, f"ALTER TABLE transacciones ADD COLUMN {name} {col_def};")
+    for name, col_def in (
+        ("monto_cents", "INTEGER NOT NULL DEFAULT 0"),
+        ("total_pesos_cents", "INTEGER NOT NULL DEFAULT 0"),
+        ("mp_preference_id", "TEXT"),
+        ("mp_payment_id", "TEXT"),
+        ("mp_status", "TEXT"),
+        ("mp_status_detail", "TEXT"),
+        ("monto_mp_cents", "INTEGER"),
+        ("monto_neto_mp_cents", "INTEGER"),
+        ("external_reference", "TEXT"),
+        ("funcion_id", "INTEGER"),
+        ("pelicula", "TEXT"),
+        ("fecha_funcion", "TEXT"),
+        ("hora_funcion", "TEXT"),
+        ("sala", "TEXT"),
+        ("asientos_json", "TEXT"),
+        ("combos_json", "TEXT"),
+        ("notas", "TEXT"),
+        ("ip_cliente", "TEXT"),
+        ("user_agent", "TEXT"),
+        ("fecha_actualizacion", "TIMESTAMP"),
+    )
+)
+
+# Conjunto completo de columnas que el código actual escribe: es la vara
+# para sellar user_version. Derivarlo de _ALTERS evita que el sello y la
+# lista de columnas vuelvan a divergir cuando se agregue una columna.
+_REQUIRED_COLUMNS = frozenset(name for name, _ in _ALTERS)
+
+def migrate_add_mercadopago_support():
+    """
+    Migración para agregar soporte completo de MercadoPago
+    Agrega tabla de transacciones y funciones mejoradas
+    """
+    
+    try:
+        conn = get_conn()
+
+        # Salida temprana: sobre una BD ya migrada todo el cuerpo es
+        # trabajo muerto, y el chequeo se resuelve con un PRAGMA (o el
+        # memo de módulo si ya corrió en este proceso).
+        if not check_migration_needed(conn):
+            return True
+
+        # Garantizar WAL + synchronous=NORMAL antes de la primera escritura:
+        # un fsync por commit de grupo en vez de dos con el rollback journal.
+        # journal_mode persiste en el header de la BD, es costo one-shot.
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-20000")  # ~20 MB de page cache
+
+        # Verificar si la tabla transacciones ya existe
+        cur = conn.execute("""
+            SELECT name FROM sqlite_master 
+            WHERE type='table' AND name='transacciones'
+        """)
+        table_exists = cur.fetchone() is not None
+        
+        if table_exists:
+            # La tabla existe, agregar columnas de MercadoPago una por una
+            current_app.logger.info("📊 Tabla transacciones existe, agregando columnas MP...")
+
+            # Consultar el esquema UNA vez en vez de probar cada ALTER a
+            # ciegas y filtrar por el mensaje de error: PRAGMA table_info
+            # devuelve las columnas existentes y sólo ejecutamos las que faltan.
+            existing = {row[1] for row in conn.execute("PRAGMA table_info(transacciones)")}
+            missing = [(name, alter_sql) for name, alter_sql in _ALTERS if name not in existing]
+
+            if missing:
+                # Todas las ALTER que faltan en un solo script/transacción:
+                # un único flush de journal en vez de uno por columna.
+                script = "BEGIN IMMEDIATE;\n" + "\n".join(
+                    alter_sql for _, alter_sql in missing
+                ) + "\nCOMMIT;"
+                conn.executescript(script)
+                # Una sola línea de resumen en vez de un log por columna;
+                # %-format difiere el armado del string al handler.
+                current_app.logger.info(
+                    "✅ Columnas MP: %d agregadas, %d ya existían (%s)",
+                    len(missing), len(_ALTERS) - len(missing),
+                    ", ".join(name for name, _ in missing),
+                )
+            else:
+                current_app.logger.info("⚡ Columnas MP ya existen")
+
+            # Backfill y drop de las columnas DECIMAL duplicadas. Además de
+            # ser el drop prometido al pasar a centavos, es necesario:
+            # total_pesos legacy es NOT NULL sin default y rompería los
+            # INSERT nuevos, que sólo escriben *_cents.
+            legacy_money = [c for c in ("total_pesos", "monto_mp", "monto_neto_mp") if c in existing]
+            if legacy_money:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    for col in legacy_money:
+                        conn.execute(
+                            f"UPDATE transacciones SET {col}_cents = CAST(ROUND({col} * 100) AS INTEGER) "
+                            f"WHERE {col} IS NOT NULL AND ({col}_cents IS NULL OR {col}_cents = 0)"
+                        )
+                        conn.execute(f"ALTER TABLE transacciones DROP COLUMN {col}")
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                current_app.logger.info(
+                    "✅ Columnas DECIMAL migradas a centavos: %s", ", ".join(legacy_money)
+                )
+
+            # Migrar email_cliente -> usuario_email si es necesario
+            if "email_cliente" in existing:
+                current_app.logger.info("🔄 Migrando email_cliente -> usuario_email")
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    if "usuario_email" not in existing:
+                        conn.execute("ALTER TABLE transacciones ADD COLUMN usuario_email TEXT")
+                    conn.execute("UPDATE transacciones SET usuario_email = email_cliente WHERE usuario_email IS NULL")
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                current_app.logger.info("✅ Migración email_cliente completada")
+            else:
+                current_app.logger.info("⚡ Tabla ya usa usuario_email")
+
+        else:
+            current_app.logger.info("🏗️ Creando tabla transacciones completa...")
+
+        # Crear las tablas e índices que falten: todo el DDL es IF NOT
+        # EXISTS, así que un único executescript cubre tanto la creación
+        # desde cero como las tablas auxiliares sobre una BD existente.
+        try:
+            executescript(_SCHEMA_SQL)
+            current_app.logger.info("✅ Esquema verificado/creado")
+        except Exception as e:
+            current_app.logger.warning(f"⚠️ Error creando tablas: {str(e)}")
+
+        # Insertar datos de ejemplo
+        try:
+            insert_sample_data(conn)
+        except Exception as e:
+            current_app.logger.warning(f"⚠️ Error insertando datos de ejemplo: {str(e)}")
+
+        # Sellar la versión de esquema para que los chequeos futuros se
+        # resuelvan con un solo PRAGMA.
+        conn.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+
+        current_app.logger.info("✅ Migración MercadoPago completada exitosamente")
+        return True
+
+    except Exception as e:
+        current_app.logger.error(f"❌ Error en migración MercadoPago: {str(e)}")
+        raise
+
+def insert_sample_data(conn=None):
+    """Inserta datos de ejemplo si las tablas están vacías.
+
+    Acepta la conexión del llamador para no re-resolver get_conn();
+    si no se pasa, la obtiene del contexto como siempre.
+    """
+
+    try:
+        if conn is None:
+            conn = get_conn()
+
+        # Un solo round-trip para ambas tablas. NOT EXISTS corta en la
+        # primera fila encontrada, en vez de que COUNT(*) recorra la tabla
+        # entera sólo para saber si está vacía.
+        try:
+            row = conn.execute(
+                "SELECT NOT EXISTS(SELECT 1 FROM funciones) AS funciones_vacia, "
+                "NOT EXISTS(SELECT 1 FROM combos) AS combos_vacia"
+            ).fetchone()
+        except Exception as e:
+            # Falta alguna tabla: no hay dónde sembrar, lo crea la migración
+            current_app.logger.warning(f"⚠️ Error verificando tablas de ejemplo: {str(e)}")
+            return
+
+        funciones_vacia = bool(row["funciones_vacia"])
+        combos_vacia = bool(row["combos_vacia"])
+        if not funciones_vacia and not combos_vacia:
+            return
+
+        # Un solo INSERT multi-fila por tabla (VALUES (...),(...),...): un
+        # único round-trip al VDBE en vez de una ejecución por fila. Son
+        # pocas filas, bien lejos del límite de 999 parámetros de SQLite.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if funciones_vacia:
+                current_app.logger.info("📝 Insertando funciones de ejemplo...")
+                filas = ", ".join(["(?, ?, ?, ?, ?)"] * len(_SAMPLE_FUNCIONES))
+                conn.execute(
+                    f"INSERT INTO funciones (pelicula, fecha, hora, sala, precio_entrada_cents) VALUES {filas}",
+                    [v for fila in _SAMPLE_FUNCIONES for v in fila],
+                )
+            if combos_vacia:
+                current_app.logger.info("🍿 Insertando combos de ejemplo...")
+                filas = ", ".join(["(?, ?, ?)"] * len(_SAMPLE_COMBOS))
+                conn.execute(
+                    f"INSERT INTO combos (nombre, descripcion, precio_cents) VALUES {filas}",
+                    [v for fila in _SAMPLE_COMBOS for v in fila],
+                )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        current_app.logger.info("✅ Datos de ejemplo insertados")
+
+    except Exception as e:
+        current_app.logger.error(f"❌ Error en insert_sample_data: {str(e)}")
+
+# Memo a nivel módulo: una vez que la BD está migrada no vuelve a
+# "des-migrarse" en el mismo proceso, así que las llamadas siguientes
+# no necesitan tocar SQLite.
+_MIGRATION_OK = False
+
+def check_migration_needed(conn=None):
+    """Verifica si se necesita ejecutar la migración"""
+    global _MIGRATION_OK
+    if _MIGRATION_OK:
+        return False
+
+    try:
+        if conn is None:
+            conn = get_conn()
+
+        # Camino rápido: el sentinela user_version lo escribe la migración
+        # al terminar, así que alcanza con leer el header de la BD.
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= _SCHEMA_VERSION:
+            _MIGRATION_OK = True
+            return False
+
+        # PRAGMA table_info da las columnas reales sin parsear el CREATE
+        # TABLE de sqlite_master con substrings (frágil ante renombres o
+        # columnas cuyo nombre contiene a otro). Set vacío => tabla no existe.
+        cols = {row[1] for row in conn.execute("PRAGMA table_info(transacciones)")}
+        if not cols:
+            return True  # Tabla no existe
+
+        if not _REQUIRED_COLUMNS.issubset(cols):
+            return True  # Falta alguna columna que el código actual usa
+
+        # BD con el esquema completo pero sin sellar (o sellada con una
+        # versión vieja): recién acá, con todas las columnas verificadas,
+        # es seguro estampar la versión actual.
+        conn.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+
+        _MIGRATION_OK = True
+        return False  # No necesita migración
+
+    except Exception as e:
+        current_app.logger.error(f"Error verificando migración: {str(e)}")
         return True  # En caso de error, ejecutar migración
\ No newline at end of file
@@ -1,9 +1,21 @@
 # app/service/payments.py
-import re, datetime as dt
+import re, datetime as dt, hashlib
+from functools import lru_cache
+
+_MC_PREFIXES = {"51", "52", "53", "54", "55"}
+
+# Cache de Luhn por hash del PAN (nunca guardamos ni logueamos el PAN en sí).
+# Bajo carga/bots el mismo número se repite; evitamos el loop O(len) repetido.
+_LUHN_CACHE: dict[bytes, bool] = {}
+_LUHN_CACHE_MAX = 2048
 
 def luhn_ok(pan: str) -> bool:
     s = ''.join(ch for ch in pan if ch.isdigit())
     if not s: return False
+    key = hashlib.blake2b(s.encode(), digest_size=8).digest()
+    cached = _LUHN_CACHE.get(key)
+    if cached is not None:
+        return cached
     tot = 0; alt = False
     for d in s[::-1]:
         n = ord(d) - 48
@@ -12,14 +24,23 @@ def luhn_ok(pan: str) -> bool:
             if n > 9: n -= 9
         tot += n
         alt = not alt
-    return (tot % 10) == 0
+    ok = (tot % 10) == 0
+    if len(_LUHN_CACHE) >= _LUHN_CACHE_MAX:
+        _LUHN_CACHE.clear()
+    _LUHN_CACHE[key] = ok
+    return ok
+
+@lru_cache(maxsize=1024)
+def _brand_cached(bin6: str, length: int) -> str:
+    """La marca depende solo del BIN (6 dígitos) + largo; cacheable."""
+    if bin6.startswith('4') and length in (13,16,19): return "VISA"
+    if bin6[:2] in _MC_PREFIXES and length == 16: return "MASTERCARD"
+    if bin6[:2] in {"34","37"} and length == 15: return "AMEX"
+    return "DESCONOCIDA"
 
 def detectar_brand(pan: str) -> str:
     s = ''.join(ch for ch in pan if ch.isdigit())
-    if s.startswith('4') and len(s) in (13,16,19): return "VISA"
-    if s[:2] in {str(n) for n in range(51,56)} and len(s) == 16: return "MASTERCARD"
-    if s[:2] in {"34","37"} and len(s) == 15: return "AMEX"
-    return "DESCONOCIDA"
+    return _brand_cached(s[:6], len(s))
 
 def vencimiento_valido(mes: int, anio: int) -> bool:
     if mes < 1 or mes > 12 or anio < 2000: return False
@@ -20,10 +20,56 @@ Uso (producción - Windows):
 from __future__ import annotations
 
 import os
-from dotenv import load_dotenv
+import pickle
+
+_ENV_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env")
+_ENV_CACHE = _ENV_FILE + ".cache.pkl"
+
+
+def _load_env_cached() -> None:
+    """
+    Carga .env evitando re-parsearlo en cada fork/comando:
+
+    - Si ENV_LOADED=1 ya está seteado (systemd/contenedor o un fork previo),
+      no se toca el disco.
+    - Si hay un cache picklado con el mismo mtime que .env, se usa ese dict.
+    - Si no, se parsea con dotenv y se escribe el cache (best-effort).
+
+    Las variables ya presentes en el entorno siempre tienen prioridad.
+    """
+    if os.environ.get("ENV_LOADED") == "1":
+        return
+    try:
+        mtime = os.stat(_ENV_FILE).st_mtime
+    except OSError:
+        os.environ["ENV_LOADED"] = "1"
+        return  # no hay .env: nada que cargar
+
+    values = None
+    try:
+        with open(_ENV_CACHE, "rb") as fh:
+            cached_mtime, cached_values = pickle.load(fh)
+        if cached_mtime == mtime:
+            values = cached_values
+    except (OSError, ValueError, pickle.PickleError, EOFError):
+        pass
+
+    if values is None:
+        from dotenv import dotenv_values  # import diferido: solo en cache miss
+        values = {k: v for k, v in dotenv_values(_ENV_FILE).items() if v is not None}
+        try:
+            with open(_ENV_CACHE, "wb") as fh:
+                pickle.dump((mtime, values), fh, protocol=pickle.HIGHEST_PROTOCOL)
+        except OSError:
+            pass  # cache opcional; sin él solo perdemos el ahorro
+
+    for key, val in values.items():
+        os.environ.setdefault(key, val)
+    os.environ["ENV_LOADED"] = "1"
+
 
 # Cargar variables de entorno desde .env si existe
-load_dotenv()
+_load_env_cached()
 
 # Importar la factory de la app
 from app import create_app  # noqa: E402  (import tardío a propósito)